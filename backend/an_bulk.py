@@ -0,0 +1,467 @@
+"""
+Bulk AN-model fitting of the growth/non-growth reading pairs stored in the
+asd-platform collection.
+
+Within one element/material/precursor/coreactant/temperature and one
+publication, every surface whose readings look like growth is paired with
+every surface that looks like non-growth (the same heuristic as
+classifySurfaceType in the frontend). Each pair is fitted with
+run_an_model in a process pool and the fit summaries are upserted into the
+an-model-fits collection with bulk writes. Pairs whose readings have not
+changed since their last successful fit are skipped, so an interrupted run
+resumes where it stopped. ANModelFitMaintainer keeps the same collection
+current as readings are edited: web workers record which elements
+changed, and one maintainer process (started by the gunicorn master, see
+gunicorn.conf.py) refits them. Fitters claim each pair atomically in
+an-model-fits before fitting it, so a bulk run and the maintainer never
+fit the same pair at once.
+
+    python an_bulk.py --element Ru --workers 4
+    python an_bulk.py --maintain
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing as mp
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from an_cache import dataset_key, UNKEYED_OPTIONS
+# numba comes through vectorized_combination, which sets its environment before loading it
+from vectorized_combination import (run_an_model, warmup_kernels, set_num_threads,
+                                    numba_config, MODEL_VERSION)
+
+PAIR_FILTER_FIELDS = ('element', 'material', 'technique', 'precursor', 'coreactant', 'temperature')
+FIT_PARAM_NAMES = ('nhat', 'ndot0', 'td')
+NEAR_ZERO_THICKNESS = 0.1
+FIT_CLAIM_SECONDS = 600  # how long a fitter's claim on a pair lasts while it fits it
+MAINTAINER_POLL_SECONDS = 5
+
+
+def classify_surface_type(readings):
+    """Port of classifySurfaceType (Comparison.js): 'growth', 'non-growth' or 'unknown'"""
+    series = reading_series(readings)
+    if len(series) < 3:
+        return "unknown"
+    thickness = [t for _, t in series]
+    score = 0
+
+    consecutive_zeros = 0
+    for t in thickness[:6]:
+        if t > NEAR_ZERO_THICKNESS:
+            break
+        consecutive_zeros += 1
+    if consecutive_zeros >= 3:
+        score -= 10
+    elif consecutive_zeros <= 1:
+        score += 5
+
+    onset = next((i for i, t in enumerate(thickness) if t > 1.0), -1)
+    if onset >= 3:
+        score -= 5
+    elif onset in (1, 2):
+        score += 5
+    elif onset == 0:
+        score += 8
+
+    first_nonzero = next((i for i, t in enumerate(thickness) if t > NEAR_ZERO_THICKNESS), -1)
+    if 0 <= first_nonzero < len(series) - 1:
+        i2 = min(first_nonzero + 2, len(series) - 1)
+        cycle_diff = series[i2][0] - series[first_nonzero][0]
+        rate = (thickness[i2] - thickness[first_nonzero]) / cycle_diff if cycle_diff > 0 else 0
+        if rate < 0.03:
+            score -= 3
+        elif rate > 0.1:
+            score += 3
+
+    if len(series) >= 5 and thickness[-1] > 0:
+        quarter_ratio = thickness[len(series) // 4] / thickness[-1]
+        half_ratio = thickness[len(series) // 2] / thickness[-1]
+        if half_ratio < 0.3 and quarter_ratio < 0.1:
+            score -= 4
+        elif half_ratio > 0.4 and quarter_ratio > 0.2:
+            score += 4
+
+    if thickness[1] > 1.5:
+        score += 6
+    elif thickness[1] <= NEAR_ZERO_THICKNESS:
+        score -= 2
+
+    if score <= -5:
+        return "non-growth"
+    if score >= 5:
+        return "growth"
+    return "non-growth" if consecutive_zeros >= 3 else "growth"
+
+
+def reading_series(readings):
+    """[{cycles, thickness}, ...] -> [[cycles, thickness], ...] sorted by cycles"""
+    series = []
+    for reading in readings or []:
+        try:
+            series.append([float(reading["cycles"]), float(reading["thickness"])])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return sorted(series)
+
+
+def publication_key(publication):
+    """Identify a publication by DOI, else first author, journal, year and title"""
+    if publication.get("doi"):
+        return publication["doi"]
+    authors = publication.get("authors") or [publication.get("author", "")]
+    return "|".join(str(v) for v in (authors[0] if authors else "", publication.get("journal", ""),
+                                     publication.get("year", ""), publication.get("title", "")))
+
+
+def pair_id(descriptor):
+    """Stable id of a reading pair from its identifying fields (not its readings)"""
+    return hashlib.sha256(json.dumps(descriptor, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+
+def iter_reading_pairs(collection, filters=None):
+    """
+    Yield one dict per growth/non-growth pair of stored readings:
+    _id, the condition fields, publication, growth_surface and
+    nongrowth_surface ({surface, pretreatment}), growth and nongrowth series.
+    filters may restrict any of PAIR_FILTER_FIELDS.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if k in PAIR_FILTER_FIELDS and v not in (None, "")}
+    query = {"element": filters["element"]} if "element" in filters else {}
+
+    for element_doc in collection.find(query, {"_id": 0}):
+        for material in element_doc.get("materials", []):
+            for pre_cor in material.get("pre_cor", []):
+                groups = {}
+                for condition in pre_cor.get("conditions", []):
+                    for pub in condition.get("publications", []):
+                        key = (str(condition.get("temperature")), publication_key(pub.get("publication", {})))
+                        groups.setdefault(key, []).append((condition, pub))
+
+                for members in groups.values():
+                    condition, first = members[0]
+                    publication = first.get("publication", {})
+                    fields = {
+                        "element": element_doc.get("element"),
+                        "material": material.get("material"),
+                        "technique": material.get("technique", ""),
+                        "precursor": pre_cor.get("precursor"),
+                        "coreactant": pre_cor.get("coreactant"),
+                        "temperature": condition.get("temperature")
+                    }
+                    if any(str(fields[k]) != str(v) for k, v in filters.items()):
+                        continue
+
+                    surfaces = {"growth": [], "non-growth": []}
+                    for condition, pub in members:
+                        readings = pub.get("readings", [])
+                        kind = classify_surface_type(readings)
+                        if kind in surfaces:
+                            surfaces[kind].append((
+                                {"surface": condition.get("surface"),
+                                 "pretreatment": condition.get("pretreatment")},
+                                reading_series(readings)
+                            ))
+
+                    for growth_surface, growth in surfaces["growth"]:
+                        for nongrowth_surface, nongrowth in surfaces["non-growth"]:
+                            descriptor = dict(fields,
+                                              publication=publication_key(publication),
+                                              growth_surface=growth_surface,
+                                              nongrowth_surface=nongrowth_surface)
+                            yield dict(descriptor, _id=pair_id(descriptor),
+                                       publication=publication,
+                                       growth=growth, nongrowth=nongrowth)
+
+
+def fit_summary(result):
+    """The stored part of a run_an_model result: parameters and RMSE, no curves"""
+    best_params = dict(zip(result["all_scenarios"][result["best_scenario"]]["param_names"],
+                           result["best_params"]))
+    return {
+        "best_scenario": result["best_scenario"],
+        "best_rmse": result["best_rmse"],
+        "best_params": result["best_params"],
+        **{name: best_params.get(name, 0.0) for name in FIT_PARAM_NAMES},
+        "scenarios": {name: {"rmse": s["rmse"], "params": s["params"]}
+                      for name, s in result.get("all_scenarios", {}).items()},
+        "model_evaluations": result.get("model_evaluations"),
+        "computation_time": result.get("computation_time"),
+        "truncated": bool(result.get("truncated"))
+    }
+
+
+def fit_pair(growth, nongrowth, options=None, quiet=True):
+    """Fit one pair, returning (summary, error)
+
+    quiet silences run_an_model's printing; it swaps sys.stdout, so only
+    pool workers use it, never a thread of the web process.
+    """
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        result = run_an_model(growth, nongrowth, max_workers=0, **(options or {}))
+    if result.get("error"):
+        return None, result["error"]
+    return fit_summary(result), None
+
+
+def _init_bulk_worker(numba_threads):
+    set_num_threads(numba_threads)
+    warmup_kernels()
+
+
+class ANModelBulkFitter:
+    def __init__(self, readings_collection, fits_collection, max_workers=None,
+                 write_batch=50, options=None, progress_callback=None, claim_for=None):
+        """
+        readings_collection: the asd-platform collection
+        fits_collection: collection receiving one fit document per pair
+        max_workers: concurrent fits (process pool size), defaults to the CPU count
+        write_batch: fits buffered per bulk_write
+        options: extra run_an_model keyword arguments
+        progress_callback: called with the progress dict after every fit
+        claim_for: when set, seconds each pair is claimed for in
+            fits_collection before it is fitted; pairs another process has
+            claimed, or has meanwhile fitted, are skipped
+        """
+        self.readings = readings_collection
+        self.fits = fits_collection
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.write_batch = write_batch
+        self.options = options or {}
+        self.progress_callback = progress_callback
+        self.claim_for = claim_for
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def input_key(self, pair):
+        """Hash of a pair's readings and the options that change its fit (not the time budget)"""
+        options = {k: v for k, v in self.options.items() if k not in UNKEYED_OPTIONS}
+        return dataset_key(pair["growth"], pair["nongrowth"], MODEL_VERSION, options)
+
+    def pending(self, pairs, force=False):
+        """Pairs without a successful fit of their current readings"""
+        if force:
+            return pairs
+        keys = {pair["_id"]: self.input_key(pair) for pair in pairs}
+        done = {doc["_id"] for doc in self.fits.find(
+            {"_id": {"$in": list(keys)}, "status": "done"}, {"input_key": 1}
+        ) if doc.get("input_key") == keys[doc["_id"]]}
+        return [pair for pair in pairs if pair["_id"] not in done]
+
+    def _claim(self, pair, force=False):
+        """Atomically claim a pair for claim_for seconds; False if another process holds it
+
+        Upserting against a filter the existing document fails raises a
+        duplicate key error, so the claim is a single find_one_and_update
+        whichever process gets there first.
+        """
+        now = datetime.now()
+        conditions = [{"$or": [{"claimed_until": None}, {"claimed_until": {"$lt": now}}]}]
+        if not force:
+            key = self.input_key(pair)
+            conditions.append({"$or": [{"status": {"$ne": "done"}}, {"input_key": {"$ne": key}}]})
+        fields = {k: v for k, v in pair.items() if k not in ("_id", "growth", "nongrowth")}
+        try:
+            self.fits.find_one_and_update(
+                {"_id": pair["_id"], "$and": conditions},
+                {"$set": {"claimed_by": self.owner,
+                          "claimed_until": now + timedelta(seconds=self.claim_for)},
+                 "$setOnInsert": dict(fields, status="pending")},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def _claimed(self, todo, progress, force=False):
+        """The pairs of todo this process may fit, claiming each just before it is handed out"""
+        for pair in todo:
+            if self.claim_for is None or self._claim(pair, force):
+                yield pair
+            else:
+                progress["skipped"] += 1
+
+    def _update(self, pair, summary, error):
+        fields = {k: v for k, v in pair.items() if k not in ("_id", "growth", "nongrowth")}
+        return UpdateOne({"_id": pair["_id"]}, {"$set": dict(
+            fields,
+            input_key=self.input_key(pair),
+            model_version=MODEL_VERSION,
+            status="failed" if error else "done",
+            fit=summary,
+            error=error,
+            claimed_until=None,
+            updated_at=datetime.now()
+        )}, upsert=True)
+
+    def prune(self, element, live_ids):
+        """Drop the element's fits whose reading pair no longer exists"""
+        return self.fits.delete_many({"element": element, "_id": {"$nin": list(live_ids)}}).deleted_count
+
+    def run(self, filters=None, force=False, prune=False):
+        """
+        Fit every pending pair matching filters; returns the final progress dict.
+        prune (with an element filter) also removes that element's stale fits.
+        """
+        start_time = time.time()
+        pairs = list(iter_reading_pairs(self.readings, filters))
+        todo = self.pending(pairs, force)
+        progress = {"total": len(pairs), "skipped": len(pairs) - len(todo),
+                    "done": 0, "failed": 0, "removed": 0, "elapsed": 0.0}
+        if prune and (filters or {}).get("element"):
+            progress["removed"] = self.prune(filters["element"], [pair["_id"] for pair in pairs])
+        ops = []
+
+        def record(pair, summary, error):
+            ops.append(self._update(pair, summary, error))
+            progress["failed" if error else "done"] += 1
+            progress["elapsed"] = time.time() - start_time
+            if len(ops) >= self.write_batch:
+                self.fits.bulk_write(ops, ordered=False)
+                ops.clear()
+            if self.progress_callback:
+                self.progress_callback(dict(progress))
+
+        claimed = self._claimed(todo, progress, force)
+        if self.max_workers == 1 or len(todo) <= 1:
+            for pair in claimed:
+                record(pair, *fit_pair(pair["growth"], pair["nongrowth"], self.options, quiet=False))
+        else:
+            self._run_pool(claimed, record)
+
+        if ops:
+            self.fits.bulk_write(ops, ordered=False)
+        progress["elapsed"] = time.time() - start_time
+        return progress
+
+    def _run_pool(self, todo, record):
+        numba_threads = max(1, numba_config.NUMBA_NUM_THREADS // self.max_workers)
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_bulk_worker, initargs=(numba_threads,)) as pool:
+            queued = iter(todo)
+            running = {}
+            # Keep at most max_workers fits in flight so pairs are read lazily
+            for pair in queued:
+                running[pool.submit(fit_pair, pair["growth"], pair["nongrowth"], self.options)] = pair
+                if len(running) >= self.max_workers:
+                    break
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pair = running.pop(future)
+                    try:
+                        summary, error = future.result()
+                    except Exception as e:
+                        summary, error = None, str(e)
+                    record(pair, summary, error)
+                    nxt = next(queued, None)
+                    if nxt is not None:
+                        running[pool.submit(fit_pair, nxt["growth"], nxt["nongrowth"], self.options)] = nxt
+
+
+class ANModelFitMaintainer:
+    """
+    Keeps an-model-fits in step with the stored readings.
+
+    The data endpoints call refresh(element) after rewriting an element
+    document; it only records the element in refresh_collection, so it is
+    cheap and safe from any web worker. run() is the maintainer itself and
+    runs in a single process (python an_bulk.py --maintain): it queues every
+    element once to catch up on edits made while it was down, then refits
+    only the pairs of each recorded element whose readings changed and
+    drops fits of pairs that no longer exist. Each fit gets options'
+    time_budget.
+    """
+    def __init__(self, readings_collection, fits_collection, refresh_collection, options=None,
+                 poll_every=MAINTAINER_POLL_SECONDS):
+        self.readings = readings_collection
+        self.fits = fits_collection
+        self.requests = refresh_collection
+        self.poll_every = poll_every
+        self.fitter = ANModelBulkFitter(readings_collection, fits_collection,
+                                        max_workers=1, write_batch=1, options=options,
+                                        claim_for=FIT_CLAIM_SECONDS)
+
+    def refresh(self, element):
+        """Record an element whose readings were added, edited or deleted"""
+        if not element:
+            return
+        try:
+            self.requests.update_one({"_id": element}, {"$set": {"requested_at": datetime.now()}},
+                                     upsert=True)
+        except Exception as e:
+            print(f"AN fit refresh request for {element} failed: {e}")
+
+    def run(self):
+        """Refit refreshed elements until the process exits"""
+        try:
+            self.fits.create_index([("element", 1), ("material", 1)])
+            for element in self.readings.distinct("element"):
+                self.refresh(element)
+        except Exception as e:
+            print(f"AN fit maintenance setup failed: {e}")
+        while True:
+            if not self._refit_next():
+                time.sleep(self.poll_every)
+
+    def _refit_next(self):
+        """Refit the longest-waiting refreshed element; False when none is waiting"""
+        try:
+            request = self.requests.find_one(sort=[("requested_at", 1)])
+            # Removed before refitting, matching requested_at so that edits
+            # arriving meanwhile record the element again
+            if request is None or self.requests.find_one_and_delete(request) is None:
+                return request is not None
+            element = request["_id"]
+            progress = self.fitter.run({"element": element}, prune=True)
+            if progress["done"] or progress["failed"] or progress["removed"]:
+                print(f"AN fits for {element}: {progress['done']} refitted, "
+                      f"{progress['failed']} failed, {progress['removed']} removed")
+        except Exception as e:
+            print(f"AN fit maintenance failed: {e}")
+        return True
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Fit the AN model to every stored growth/non-growth pair")
+    for field in PAIR_FILTER_FIELDS:
+        parser.add_argument(f"--{field}")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent fits (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="refit pairs that are already up to date")
+    parser.add_argument("--maintain", action="store_true",
+                        help="run the fit maintainer: refit elements as their readings change")
+    args = parser.parse_args()
+
+    if args.maintain and not Config.AN_FIT_MAINTAINER:
+        print("AN fit maintainer disabled (AN_FIT_MAINTAINER=0)")
+        sys.exit(0)
+
+    db = MongoClient(Config.MONGO_URL).get_database(Config.DB_NAME)
+    if args.maintain:
+        ANModelFitMaintainer(
+            db["asd-platform"], db["an-model-fits"], db["an-model-fit-refresh"],
+            options={"time_budget": Config.AN_FIT_TIME_BUDGET_SECONDS}
+        ).run()
+
+    fitter = ANModelBulkFitter(
+        db["asd-platform"], db["an-model-fits"], max_workers=args.workers,
+        options={"time_budget": Config.AN_FIT_TIME_BUDGET_SECONDS}, claim_for=FIT_CLAIM_SECONDS,
+        progress_callback=lambda p: print(
+            f"{p['done'] + p['failed'] + p['skipped']}/{p['total']} pairs "
+            f"({p['failed']} failed, {p['skipped']} up to date or claimed) {p['elapsed']:.0f}s"
+        )
+    )
+    progress = fitter.run({field: getattr(args, field) for field in PAIR_FILTER_FIELDS}, force=args.force)
+    print(f"Fitted {progress['done']} pairs, {progress['failed']} failed, "
+          f"{progress['skipped']} already up to date or claimed in {progress['elapsed']:.1f}s")
@@ -0,0 +1,123 @@
+"""
+Content-addressed cache of run_an_model results in MongoDB.
+
+Entries are keyed by a SHA-256 of the growth array, the non-growth array,
+the run options and the model version, so re-running the same datasets
+returns the stored fit. Entries written by another model version are
+purged on start(); a TTL index and a maximum entry count evict old ones.
+Runs cut short by their time budget are never stored. The cache is an
+optimization only: when MongoDB is unavailable get() reports a miss and
+put() skips the write, so the fit is computed as if nothing was cached.
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import pymongo
+from pymongo import ASCENDING
+
+# Options that change how long a run may take, not what a complete run returns
+UNKEYED_OPTIONS = ('time_budget',)
+
+
+def dataset_key(growth, nongrowth, model_version, options=None):
+    """Canonical hash of a model run's inputs"""
+    digest = hashlib.sha256()
+    digest.update(model_version.encode())
+    for series in (growth, nongrowth):
+        # float64 little-endian, with -0.0 folded into 0.0
+        arr = np.ascontiguousarray(np.asarray(series, dtype='<f8') + 0.0)
+        digest.update(str(arr.shape).encode())
+        digest.update(arr.tobytes())
+    digest.update(json.dumps(options or {}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ANModelResultCache:
+    def __init__(self, collection, model_version, max_entries=5000,
+                 max_age=30 * 24 * 3600, op_timeout=2.0):
+        """op_timeout: seconds a cache read or write may take before it is
+        given up on, so an unreachable MongoDB does not stall every fit"""
+        self.collection = collection
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.op_timeout = op_timeout
+
+    def start(self):
+        """Create indexes and drop stale versions without blocking startup"""
+        threading.Thread(target=self._start, daemon=True).start()
+
+    def _start(self):
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=self.max_age)
+            self.collection.create_index([("last_used", ASCENDING)])
+            removed = self.collection.delete_many(
+                {"version": {"$ne": self.model_version}}
+            ).deleted_count
+            if removed:
+                print(f"Removed {removed} AN model cache entries from older model versions")
+        except Exception as e:
+            print(f"AN model cache setup failed: {e}")
+
+    def key(self, growth, nongrowth, options=None):
+        options = {k: v for k, v in (options or {}).items() if k not in UNKEYED_OPTIONS}
+        return dataset_key(growth, nongrowth, self.model_version, options)
+
+    def get(self, key):
+        """Stored result for key, or None on a miss or when the cache is unreachable"""
+        try:
+            with pymongo.timeout(self.op_timeout):
+                doc = self.collection.find_one_and_update(
+                    {"_id": key, "version": self.model_version},
+                    {"$set": {"last_used": datetime.now()}, "$inc": {"hits": 1}},
+                    projection={"result": 1}
+                )
+        except Exception as e:
+            print(f"AN model cache read failed: {e}")
+            return None
+        return doc["result"] if doc else None
+
+    def put(self, key, result):
+        """Store result under key; a failed write is logged and ignored"""
+        now = datetime.now()
+        try:
+            with pymongo.timeout(self.op_timeout):
+                self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "version": self.model_version,
+                        "result": result,
+                        "hits": 0,
+                        "created_at": now,
+                        "last_used": now
+                    },
+                    upsert=True
+                )
+                self._evict()
+        except Exception as e:
+            print(f"AN model cache write failed: {e}")
+
+    def _evict(self):
+        """Drop the least recently used entries beyond max_entries"""
+        excess = self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return
+        stale = [doc["_id"] for doc in self.collection.find({}, {"_id": 1})
+                 .sort("last_used", ASCENDING).limit(excess)]
+        self.collection.delete_many({"_id": {"$in": stale}})
+
+    def cached_run(self, run_fn):
+        """Wrap a run_an_model-style callable with this cache"""
+        def run(growth, nongrowth, progress_callback=None, **options):
+            key = self.key(growth, nongrowth, options)
+            result = self.get(key)
+            if result is not None:
+                return dict(result, cached=True)
+            result = run_fn(growth, nongrowth, progress_callback=progress_callback, **options)
+            if not result.get("error") and not result.get("truncated"):
+                self.put(key, result)
+            return result
+        return run
@@ -0,0 +1,346 @@
+"""
+Compute backends for AN-model fits.
+
+A backend runs run_an_model somewhere: in this process (LocalBackend), on a
+remote worker over HTTP (HTTPBackend, e.g. the lab machine or another
+instance of this app at /compute/an-model), or on AWS Lambda
+(LambdaBackend). ComputeRouter sends each run to the least loaded
+available backend and falls back to the next one when a backend fails.
+With fan_out (AN_COMPUTE_FAN_OUT, off by default) and several backends
+available it fans the scenarios out across them in dependency waves so
+each scenario still starts from the optima it nests. A remote that
+predates the scenarios/warmStarts/curves keys runs every scenario for a
+part; such a result is discarded and the backend is no longer sent parts.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from vectorized_combination import run_an_model, select_best, SCENARIO_DEPENDENCIES
+
+
+class BackendUnavailable(Exception):
+    """No compute backend could run the request"""
+
+
+def options_to_payload(growth, nongrowth, options):
+    """JSON body of /compute/an-model for run_an_model keyword options"""
+    payload = {"growth": growth, "nongrowth": nongrowth}
+    if options.get("global_search"):
+        payload["globalSearch"] = options["global_search"]
+    if options.get("time_budget"):
+        payload["timeBudget"] = options["time_budget"]
+    if options.get("scenarios"):
+        payload["scenarios"] = list(options["scenarios"])
+    if options.get("warm_starts"):
+        payload["warmStarts"] = options["warm_starts"]
+    if options.get("curves"):
+        payload["curves"] = options["curves"]
+    if options.get("surrogate"):
+        payload["surrogate"] = options["surrogate"]
+    return payload
+
+
+def payload_to_options(data):
+    """Inverse of options_to_payload: run_an_model keyword options from a request body"""
+    options = {}
+    if data.get("globalSearch"):
+        options["global_search"] = data["globalSearch"]
+    if data.get("timeBudget"):
+        options["time_budget"] = float(data["timeBudget"])
+    if data.get("scenarios"):
+        options["scenarios"] = list(data["scenarios"])
+    if data.get("warmStarts"):
+        options["warm_starts"] = data["warmStarts"]
+    if data.get("curves"):
+        options["curves"] = data["curves"]
+    if data.get("surrogate"):
+        options["surrogate"] = data["surrogate"]
+    return options
+
+
+class ComputeBackend:
+    """Base class: availability, load and a cool-down after failures
+
+    in_flight is maintained by ComputeRouter, which picks a backend and
+    counts the request against it in one step.
+    """
+    def __init__(self, name, max_concurrency=1, cooldown=60):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._failed_at = None
+        # None until a fan-out part shows whether the backend honours "scenarios"
+        self.supports_scenarios = None
+
+    @property
+    def load(self):
+        return self.in_flight / self.max_concurrency
+
+    def available(self):
+        return self._failed_at is None or time.time() - self._failed_at > self.cooldown
+
+    def run(self, growth, nongrowth, options):
+        """run_an_model result dict; raises when the backend cannot compute"""
+        try:
+            result = self._run(growth, nongrowth, options)
+        except Exception:
+            self._failed_at = time.time()
+            raise
+        self._failed_at = None
+        return result
+
+    def _run(self, growth, nongrowth, options):
+        raise NotImplementedError
+
+    def status(self):
+        return {"name": self.name, "available": self.available(), "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency}
+
+
+class LocalBackend(ComputeBackend):
+    """run_an_model in this process; scenarios use the AN_MODEL_WORKERS pool"""
+    def __init__(self, max_concurrency=1, max_workers=None):
+        super().__init__("local", max_concurrency=max_concurrency, cooldown=0)
+        self.max_workers = max_workers
+        self.supports_scenarios = True
+
+    def _run(self, growth, nongrowth, options):
+        result = run_an_model(growth, nongrowth, max_workers=self.max_workers, **options)
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+        return result
+
+
+class HTTPBackend(ComputeBackend):
+    """A remote /compute/an-model worker, reached over a pooled keep-alive session"""
+    def __init__(self, name, url, max_concurrency=2, timeout=300, cooldown=60, token=None):
+        super().__init__(name, max_concurrency=max_concurrency, cooldown=cooldown)
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(url, HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency))
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "ngrok-skip-browser-warning": "true"
+        })
+        if token:
+            self.session.headers["X-Compute-Token"] = token
+
+    def _run(self, growth, nongrowth, options):
+        # Leave the worker its whole time budget before giving up on it
+        timeout = max(self.timeout, (options.get("time_budget") or 0) + 20)
+        response = self.session.post(self.url, json=options_to_payload(growth, nongrowth, options),
+                                     timeout=timeout)
+        if response.status_code != 200:
+            try:
+                detail = response.json().get("error", "Unknown error")
+            except ValueError:
+                detail = response.text
+            raise RuntimeError(f"{self.name} returned {response.status_code} - {detail}")
+        return response.json()
+
+
+class LambdaBackend(ComputeBackend):
+    """The configured AWS Lambda function, invoked synchronously through boto3"""
+    def __init__(self, function_name, region, max_concurrency=4, timeout=300, cooldown=60):
+        super().__init__("lambda", max_concurrency=max_concurrency, cooldown=cooldown)
+        self.function_name = function_name
+        self.region = region
+        self.timeout = timeout
+        self._client = None
+        self._has_credentials = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            from botocore.config import Config as BotoConfig
+            self._client = boto3.client("lambda", region_name=self.region, config=BotoConfig(
+                read_timeout=self.timeout, retries={"max_attempts": 0},
+                max_pool_connections=self.max_concurrency
+            ))
+        return self._client
+
+    def available(self):
+        if not self.function_name or not super().available():
+            return False
+        if self._has_credentials is None:
+            try:
+                import boto3
+                self._has_credentials = boto3.Session().get_credentials() is not None
+            except Exception:
+                self._has_credentials = False
+        return self._has_credentials
+
+    def _run(self, growth, nongrowth, options):
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType="RequestResponse",
+            Payload=json.dumps(options_to_payload(growth, nongrowth, options)).encode()
+        )
+        body = json.loads(response["Payload"].read() or b"{}")
+        if response.get("FunctionError"):
+            raise RuntimeError(f"Lambda error: {body.get('errorMessage', body)}")
+        # Functions behind API Gateway wrap the result as {"statusCode", "body"}
+        if "statusCode" in body:
+            if body["statusCode"] != 200:
+                raise RuntimeError(f"Lambda returned {body['statusCode']} - {body.get('body')}")
+            body = json.loads(body["body"]) if isinstance(body.get("body"), str) else body["body"]
+        if body.get("error"):
+            raise RuntimeError(body["error"])
+        return body
+
+
+def scenario_waves():
+    """Scenario names grouped so every scenario comes after the ones it nests"""
+    waves, placed = [], set()
+    while len(placed) < len(SCENARIO_DEPENDENCIES):
+        wave = [name for name, deps in SCENARIO_DEPENDENCIES.items()
+                if name not in placed and all(d in placed for d in deps)]
+        waves.append(wave)
+        placed.update(wave)
+    return waves
+
+
+class ComputeRouter:
+    def __init__(self, backends, fan_out=True):
+        """backends: ComputeBackend instances in order of preference"""
+        self.backends = backends
+        self.fan_out = fan_out
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="an-compute")
+
+    def available(self, scenarios=False):
+        """Available backends; with scenarios, only those not known to ignore them"""
+        return [b for b in self.backends
+                if b.available() and not (scenarios and b.supports_scenarios is False)]
+
+    def _ranked(self, exclude=(), scenarios=False):
+        """Available backends, least loaded first, preference order breaking ties"""
+        usable = self.available(scenarios)
+        candidates = [(b.load >= 1, b.load, i, b) for i, b in enumerate(self.backends)
+                      if b in usable and b not in exclude]
+        return [b for *_, b in sorted(candidates, key=lambda c: c[:3])]
+
+    def _run_with_fallback(self, growth, nongrowth, options):
+        """(backend name, result) from the best backend that succeeds"""
+        tried, errors = [], []
+        scenarios = set(options.get("scenarios") or ())
+        while True:
+            with self._lock:
+                ranked = self._ranked(exclude=tried, scenarios=bool(scenarios))
+                if not ranked:
+                    raise BackendUnavailable("; ".join(errors) or "No compute backend available")
+                backend = ranked[0]
+                backend.in_flight += 1
+            tried.append(backend)
+            try:
+                result = backend.run(growth, nongrowth, options)
+                if scenarios:
+                    # An older remote ignores "scenarios" and fits all of them
+                    backend.supports_scenarios = set(result.get("all_scenarios", {})) <= scenarios
+                    if not backend.supports_scenarios:
+                        raise RuntimeError("ignores the scenarios option; not sending it parts")
+                return backend.name, result
+            except Exception as e:
+                print(f"Compute backend {backend.name} failed: {e}")
+                errors.append(f"{backend.name}: {e}")
+            finally:
+                with self._lock:
+                    backend.in_flight -= 1
+
+    def run(self, growth, nongrowth, options=None):
+        """run_an_model result, with "backends" naming where each scenario ran"""
+        options = dict(options or {})
+        if self.fan_out and len(self.available(scenarios=True)) > 1 and not options.get("scenarios"):
+            return self._run_fanned_out(growth, nongrowth, options)
+        name, result = self._run_with_fallback(growth, nongrowth, options)
+        result["backends"] = {scenario: name for scenario in result.get("all_scenarios", {})}
+        return result
+
+    def _run_fanned_out(self, growth, nongrowth, options):
+        start_time = time.time()
+        deadline = start_time + options["time_budget"] if options.get("time_budget") else None
+        waves = scenario_waves()
+        parts, where, completed_at = [], {}, {}
+
+        for i, wave in enumerate(waves):
+            wave_options = dict(options, warm_starts={
+                name: entry for part in parts for name, entry in part["all_scenarios"].items()
+            })
+            if deadline is not None:
+                wave_options["time_budget"] = max(deadline - time.time(), 1.0) / (len(waves) - i)
+
+            futures = {
+                name: self._executor.submit(self._run_with_fallback, growth, nongrowth,
+                                            dict(wave_options, scenarios=[name]))
+                for name in wave
+            }
+            for name, future in futures.items():
+                backend_name, part = future.result()
+                parts.append(part)
+                where[name] = backend_name
+                completed_at[name] = time.time() - start_time
+
+        return self._merge(parts, where, completed_at, start_time, options)
+
+    @staticmethod
+    def _merge(parts, where, completed_at, start_time, options):
+        all_scenarios = {}
+        for name in SCENARIO_DEPENDENCIES:
+            for part in parts:
+                if name in part.get("all_scenarios", {}):
+                    all_scenarios[name] = part["all_scenarios"][name]
+
+        best_name, best = select_best(all_scenarios)
+        if best_name is None:
+            raise BackendUnavailable("No scenario produced a valid fit")
+
+        first = parts[0]
+        # Each part fitted one scenario, so its top-level curves are that scenario's
+        best_part = next(p for p in parts if p["best_scenario"] == best_name)
+        return {
+            "best_scenario": best_name,
+            "best_rmse": best["rmse"],
+            "best_params": best["params"],
+            "growth": first["growth"],
+            "nongrowth": first["nongrowth"],
+            "model_x": best_part["model_x"],
+            "model_growth_y": best_part["model_growth_y"],
+            "model_nongrowth_y": best_part["model_nongrowth_y"],
+            "all_scenarios": all_scenarios,
+            "computation_time": time.time() - start_time,
+            "model_memory_bytes": first.get("model_memory_bytes"),
+            "time_to_best": completed_at[best_name],
+            "model_evaluations": sum(p.get("model_evaluations", 0) for p in parts),
+            "cache_hits": sum(p.get("cache_hits", 0) for p in parts),
+            "truncated": any(p.get("truncated") for p in parts),
+            "approximate": any(p.get("approximate") for p in parts),
+            "time_budget": options.get("time_budget"),
+            "backends": where
+        }
+
+    def status(self):
+        return [b.status() for b in self.backends]
+
+
+def build_router(config):
+    """ComputeRouter for the backends named in config.AN_COMPUTE_BACKENDS"""
+    backends = []
+    for name in config.AN_COMPUTE_BACKENDS:
+        if name == "lab" and config.AN_LAB_URL:
+            backends.append(HTTPBackend("lab", config.AN_LAB_URL,
+                                        max_concurrency=config.AN_LAB_CONCURRENCY,
+                                        token=config.AN_COMPUTE_TOKEN))
+        elif name == "lambda" and config.LAMBDA_FUNCTION_NAME:
+            backends.append(LambdaBackend(config.LAMBDA_FUNCTION_NAME, config.AWS_DEFAULT_REGION,
+                                          max_concurrency=config.AN_LAMBDA_CONCURRENCY))
+        elif name == "local":
+            backends.append(LocalBackend(max_concurrency=config.AN_LOCAL_CONCURRENCY))
+    return ComputeRouter(backends, fan_out=config.AN_COMPUTE_FAN_OUT)
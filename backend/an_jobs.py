@@ -0,0 +1,204 @@
+"""
+Asynchronous AN-model jobs.
+
+POST /api/an-model/jobs enqueues a fit and returns at once; a bounded
+thread pool in each gunicorn worker runs the fits. Job state, progress
+and results live in MongoDB so they survive a worker restart. Every
+worker heartbeats the jobs it is running and periodically runs recover(),
+which re-queues running jobs whose owner is gone: a process on this host
+that no longer exists, or any owner that stopped heartbeating.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+class ANModelJobManager:
+    def __init__(self, jobs_collection, run_fn, max_workers=2,
+                 stale_after=120, keep_for=7 * 24 * 3600, heartbeat_every=30):
+        """
+        jobs_collection: MongoDB collection holding one document per job
+        run_fn: callable(growth, nongrowth, progress_callback=..., **options)
+            returning the run_an_model result dict
+        stale_after: seconds without a heartbeat or progress update after
+            which a running job is considered orphaned
+        keep_for: seconds a finished job is kept before MongoDB expires it
+        heartbeat_every: seconds between heartbeats and recover() runs
+        """
+        self.jobs = jobs_collection
+        self.run_fn = run_fn
+        self.max_workers = max_workers
+        self.stale_after = timedelta(seconds=stale_after)
+        self.keep_for = timedelta(seconds=keep_for)
+        self.heartbeat_every = heartbeat_every
+        self.hostname = socket.gethostname()
+        self.owner = f"{self.hostname}:{os.getpid()}"
+        self._executor = None
+        self._submitted = set()  # job ids handed to this process's executor
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Create indexes, then heartbeat and recover periodically, without blocking startup"""
+        threading.Thread(target=self._start, daemon=True).start()
+
+    def _start(self):
+        try:
+            self.jobs.create_index([("status", ASCENDING), ("updated_at", ASCENDING)])
+            self.jobs.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            print(f"AN job index creation failed: {e}")
+        while True:
+            try:
+                self.heartbeat()
+                self.recover()
+            except Exception as e:
+                print(f"AN job recovery failed: {e}")
+            time.sleep(self.heartbeat_every)
+
+    @property
+    def executor(self):
+        # Created lazily so forked gunicorn workers each get their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="an-job"
+                )
+            return self._executor
+
+    def submit(self, growth, nongrowth, options=None):
+        now = datetime.now()
+        job_id = uuid.uuid4().hex
+        self.jobs.insert_one({
+            "_id": job_id,
+            "status": "queued",
+            "growth": growth,
+            "nongrowth": nongrowth,
+            "options": options or {},
+            "progress": None,
+            "result": None,
+            "error": None,
+            "owner": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        self._submit(job_id)
+        return job_id
+
+    def _submit(self, job_id):
+        with self._lock:
+            if job_id in self._submitted:
+                return False
+            self._submitted.add(job_id)
+        self.executor.submit(self._run, job_id)
+        return True
+
+    def get(self, job_id):
+        doc = self.jobs.find_one({"_id": job_id}, {"growth": 0, "nongrowth": 0})
+        if doc is None:
+            return None
+        doc["job_id"] = doc.pop("_id")
+        return doc
+
+    def heartbeat(self):
+        """Mark the jobs this process is running as alive"""
+        self.jobs.update_many(
+            {"status": "running", "owner": self.owner},
+            {"$set": {"updated_at": datetime.now()}}
+        )
+
+    def _owner_dead(self, owner):
+        """True when owner is a process on this host that no longer exists"""
+        host, _, pid = (owner or "").rpartition(":")
+        if host != self.hostname or not pid.isdigit() or int(pid) == os.getpid():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def recover(self):
+        """Re-queue orphaned running jobs and submit queued ones this process has not"""
+        cutoff = datetime.now() - self.stale_after
+        orphaned = 0
+        for doc in self.jobs.find({"status": "running"}, {"owner": 1, "updated_at": 1}):
+            if doc["updated_at"] >= cutoff and not self._owner_dead(doc.get("owner")):
+                continue
+            # Conditional on the owner, so a job claimed again meanwhile is left alone
+            orphaned += self.jobs.update_one(
+                {"_id": doc["_id"], "status": "running", "owner": doc.get("owner")},
+                {"$set": {"status": "queued", "owner": None, "updated_at": datetime.now()}}
+            ).modified_count
+        if orphaned:
+            print(f"Re-queued {orphaned} orphaned AN model jobs")
+
+        resubmitted = 0
+        for doc in self.jobs.find({"status": "queued"}, {"_id": 1}):
+            resubmitted += self._submit(doc["_id"])
+        if resubmitted:
+            print(f"Resubmitted {resubmitted} queued AN model jobs")
+
+    def _claim(self, job_id):
+        # Atomic, so a job resubmitted by several workers only runs once
+        return self.jobs.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {
+                "status": "running",
+                "owner": self.owner,
+                "started_at": datetime.now(),
+                "updated_at": datetime.now()
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = datetime.now()
+        self.jobs.update_one({"_id": job_id}, {"$set": {
+            "status": status,
+            "result": result,
+            "error": error,
+            "finished_at": now,
+            "updated_at": now,
+            "expires_at": now + self.keep_for
+        }})
+
+    def _run(self, job_id):
+        try:
+            self._run_claimed(job_id)
+        finally:
+            with self._lock:
+                self._submitted.discard(job_id)
+
+    def _run_claimed(self, job_id):
+        job = self._claim(job_id)
+        if job is None:
+            return
+
+        def progress(event):
+            self.jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"progress": event, "updated_at": datetime.now()}}
+            )
+
+        try:
+            result = self.run_fn(job["growth"], job["nongrowth"],
+                                 progress_callback=progress, **job["options"])
+            if result.get("error"):
+                self._finish(job_id, "failed", result=result, error=result["error"])
+            else:
+                self._finish(job_id, "done", result=result)
+        except Exception as e:
+            print(f"AN model job {job_id} failed: {e}")
+            print(traceback.format_exc())
+            self._finish(job_id, "failed", error=str(e))
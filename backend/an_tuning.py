@@ -0,0 +1,183 @@
+"""
+Interactive parameter-tuning sessions for the AN model.
+
+The parameter sliders used to post the whole dataset with every change.
+Instead the client opens a session once with its growth and non-growth
+data; the server keeps the preprocessed arrays, gdot, the time axis, the
+growth curve and the observed-cycle lookup, plus the most recent
+evaluations, and each slider update sends only [nhat, ndot0, td].
+
+Sessions live in memory in the worker process that opened them and expire
+after `ttl` seconds without use; a client that gets a 404 simply opens a
+new one. Every evaluation's latency is recorded so the p95 can be checked
+against the interactive target.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from vectorized_combination import (prepare_model_inputs, observed_cycle_indices,
+                                    compute_thickness_exact)
+
+LATENCY_WINDOW = 200  # evaluations kept per session for the latency percentiles
+
+
+class ANTuningSession:
+    def __init__(self, session_id, growth, nongrowth, max_evaluations=64):
+        self.session_id = session_id
+        self.data1, self.data2, self.gdot, self.ncycles = prepare_model_inputs(growth, nongrowth)
+        self.rmax = self.ncycles + 1
+        if self.rmax < 2:
+            raise ValueError(f"ncycles must be at least 1, got {self.ncycles}")
+        self.obs_idx = observed_cycle_indices(self.rmax, self.data2[:, 0])
+
+        # Parameter-independent parts of every response, serialized once
+        self.growth = self.data1.tolist()
+        self.nongrowth = self.data2.tolist()
+        self.model_x = list(range(self.rmax))
+        self.model_growth_y = (self.gdot * np.arange(self.rmax)).tolist()
+
+        self.max_evaluations = max_evaluations
+        self._evaluations = OrderedDict()  # (nhat, ndot0, td) -> (rmse, thickness)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.evaluations = 0
+        self.cache_hits = 0
+        self.created_at = self.last_used = time.time()
+        self._lock = threading.Lock()
+
+    def _thickness(self, key):
+        """(rmse, model thickness for cycles 0..ncycles), from recent evaluations if possible"""
+        if key in self._evaluations:
+            self._evaluations.move_to_end(key)
+            self.cache_hits += 1
+            return self._evaluations[key]
+
+        nhat, ndot0, td = key
+        thickness = np.zeros(self.rmax)
+        thickness[1:] = compute_thickness_exact(nhat, ndot0, td, self.gdot, self.rmax, 1)
+        rmse = float(np.sqrt(np.mean((self.data2[:, 1] - thickness[self.obs_idx])**2)))
+        if not np.isfinite(rmse):
+            rmse = 1e6
+
+        self._evaluations[key] = (rmse, thickness)
+        if len(self._evaluations) > self.max_evaluations:
+            self._evaluations.popitem(last=False)
+        return rmse, thickness
+
+    def evaluate(self, params, scenario=""):
+        """Model at [nhat, ndot0, td], in the /api/an-model customParams result format"""
+        if len(params) != 3:
+            raise ValueError(f"Expected exactly 3 parameters [nhat, ndot0, td], got {len(params)}")
+        key = (float(params[0]), float(params[1]), int(float(params[2])))
+
+        start = time.perf_counter()
+        with self._lock:
+            rmse, thickness = self._thickness(key)
+            self.evaluations += 1
+            self.last_used = time.time()
+        model_nongrowth_y = thickness.tolist()
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+
+        best_params = list(key)
+        return {
+            "session_id": self.session_id,
+            "best_scenario": scenario,
+            "best_rmse": rmse,
+            "best_params": best_params,
+            "growth": self.growth,
+            "nongrowth": self.nongrowth,
+            "model_x": self.model_x,
+            "model_growth_y": self.model_growth_y,
+            "model_nongrowth_y": model_nongrowth_y,
+            "all_scenarios": {scenario: {
+                "rmse": rmse,
+                "params": best_params,
+                "model_x": self.model_x,
+                "model_growth_y": self.model_growth_y,
+                "model_nongrowth_y": model_nongrowth_y
+            }},
+            "computation_time": latency,
+            "custom_computation": True
+        }
+
+    def latency_stats(self, target):
+        """Percentiles (seconds) of the recent evaluation latencies against `target`"""
+        latencies = np.array(self.latencies)
+        stats = {"count": len(latencies), "target": target}
+        if len(latencies):
+            stats.update({
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max())
+            })
+            stats["meets_target"] = stats["p95"] <= target
+        return stats
+
+    def status(self, target):
+        return {
+            "session_id": self.session_id,
+            "gdot": float(self.gdot),
+            "ncycles": self.ncycles,
+            "evaluations": self.evaluations,
+            "cache_hits": self.cache_hits,
+            "idle_seconds": time.time() - self.last_used,
+            "latency": self.latency_stats(target)
+        }
+
+
+class ANTuningSessionManager:
+    def __init__(self, ttl=900, max_sessions=200, max_evaluations=64, latency_target=0.1):
+        """
+        ttl: seconds without an evaluation after which a session expires
+        max_sessions: sessions kept per process; the least recently used go first
+        max_evaluations: recent evaluations remembered per session
+        latency_target: p95 evaluation latency (seconds) reported against
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_evaluations = max_evaluations
+        self.latency_target = latency_target
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, growth, nongrowth):
+        session = ANTuningSession(uuid.uuid4().hex, growth, nongrowth, self.max_evaluations)
+        with self._lock:
+            self._expire()
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id):
+        """The live session, or None when it is unknown or has expired"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for session_id in [s.session_id for s in self._sessions.values() if s.last_used < cutoff]:
+            del self._sessions[session_id]
+
+    def status(self):
+        with self._lock:
+            self._expire()
+            sessions = list(self._sessions.values())
+        latencies = np.array([latency for s in sessions for latency in s.latencies])
+        return {
+            "sessions": len(sessions),
+            "p95": float(np.percentile(latencies, 95)) if len(latencies) else None,
+            "target": self.latency_target
+        }
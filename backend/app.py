@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, redirect, session
+from flask import Flask, jsonify, request, redirect, session, Response
 from authlib.integrations.flask_client import OAuth
 from flask_cors import CORS
 from pymongo import MongoClient
@@ -6,15 +6,25 @@ from config import Config
 from flask_mail import Mail, Message
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
+import hmac
 import json
-import requests
+import queue
+import threading
+import uuid
 import numpy as np
-from vectorized_combination import run_an_model
+from vectorized_combination import (run_an_model, run_an_model_multi, bootstrap_an_model,
+                                    AN_Model_batch, prepare_model_inputs, model_state,
+                                    WARMUP_STATS, MODEL_VERSION)
 import traceback
 import os
 from werkzeug.utils import secure_filename
 import tempfile
 from script import ASDParameterExtractor
+from an_jobs import ANModelJobManager
+from an_cache import ANModelResultCache
+from an_bulk import ANModelBulkFitter, ANModelFitMaintainer, PAIR_FILTER_FIELDS, FIT_CLAIM_SECONDS
+from an_compute import build_router, payload_to_options, BackendUnavailable
+from an_tuning import ANTuningSessionManager
 import google.generativeai as genai
 
 app = Flask(__name__)
@@ -80,10 +90,48 @@ approved_users = db["approved-users"]
 pending_submissions = db["pending-submissions"]
 authorized_users = db["authorized-users"]
 query_history = db["query-history"]
+an_model_jobs = db["an-model-jobs"]
+an_model_cache = db["an-model-cache"]
+an_model_fits = db["an-model-fits"]
+an_model_fit_refresh = db["an-model-fit-refresh"]
+an_model_bulk_runs = db["an-model-bulk-runs"]
+
+an_cache = ANModelResultCache(
+    an_model_cache, MODEL_VERSION,
+    max_entries=Config.AN_CACHE_MAX_ENTRIES,
+    max_age=Config.AN_CACHE_MAX_AGE_SECONDS,
+    op_timeout=Config.AN_CACHE_OP_TIMEOUT_SECONDS
+)
+an_cache.start()
+
+an_jobs = ANModelJobManager(
+    an_model_jobs, an_cache.cached_run(run_an_model),
+    max_workers=Config.AN_JOB_WORKERS,
+    stale_after=Config.AN_JOB_STALE_SECONDS,
+    keep_for=Config.AN_JOB_TTL_SECONDS,
+    heartbeat_every=Config.AN_JOB_HEARTBEAT_SECONDS
+)
+an_jobs.start()
+
+# Records edited elements only; the maintainer process (an_bulk.py --maintain) refits them
+an_fits = ANModelFitMaintainer(collection, an_model_fits, an_model_fit_refresh)
+
+compute_router = build_router(Config)
+
+tuning_sessions = ANTuningSessionManager(
+    ttl=Config.AN_TUNING_SESSION_TTL_SECONDS,
+    max_sessions=Config.AN_TUNING_MAX_SESSIONS,
+    latency_target=Config.AN_TUNING_LATENCY_TARGET_MS / 1000
+)
 
 @app.route("/api/health", methods=["GET"])
 def health_check():
-    return jsonify({"status": "Backend is running"}), 200
+    return jsonify({
+        "status": "Backend is running",
+        "model_warmup": WARMUP_STATS,
+        "compute_backends": compute_router.status(),
+        "tuning_sessions": tuning_sessions.status()
+    }), 200
 
 @app.route("/api/request-access", methods=["POST"])
 def request_access():
@@ -435,6 +483,7 @@ def add_data_to_db(data, submitter):
     if "_id" in element_doc:
         element_doc.pop("_id")
     collection.replace_one({"element": element}, element_doc, upsert=True)
+    an_fits.refresh(element)
     
     return jsonify({"message": "Data added successfully"}), 201
 
@@ -595,6 +644,7 @@ def update_data():
                 element_doc["materials"].remove(material)
 
         collection.replace_one({"element": original["element"]}, element_doc)
+        an_fits.refresh(original["element"])
         return jsonify({"message": "Data updated successfully"}), 200
 
     except Exception as e:
@@ -1488,6 +1538,7 @@ def delete_data():
                 element_doc['materials'].remove(material)
 
         collection.replace_one({"element": element}, element_doc)
+        an_fits.refresh(element)
         
         return jsonify({"message": "Data deleted successfully"}), 200
 
@@ -1547,6 +1598,8 @@ def filter_data():
     surface = request.args.get("surface")
     technique = request.args.get("technique")
 
+    fits = condition_fit_summaries(material, technique)
+
     results = []
     for doc in collection.find():
         for m in doc.get("materials", []):
@@ -1558,6 +1611,9 @@ def filter_data():
                 for cond in pc.get("conditions", []):
                     if surface and cond["surface"] != surface:
                         continue
+                    fit_key = (doc["element"], m["material"], m.get("technique", ""), pc["precursor"],
+                               pc["coreactant"], str(cond.get("temperature")),
+                               cond["surface"], cond["pretreatment"])
                     results.append({
                         "element": doc["element"],
                         "material": m["material"],
@@ -1567,10 +1623,37 @@ def filter_data():
                         "surface": cond["surface"],
                         "pretreatment": cond["pretreatment"],
                         "temperature": cond.get("temperature", ""),
-                        "publications": [p["publication"] for p in cond.get("publications", [])]
+                        "publications": [p["publication"] for p in cond.get("publications", [])],
+                        "an_model_fits": fits.get(fit_key, [])
                     })
     return jsonify(results)
 
+def condition_fit_summaries(material=None, technique=None):
+    """Stored AN-model fits indexed by the condition of either surface of the pair"""
+    query = {"status": "done"}
+    if material:
+        query["material"] = material
+    if technique:
+        query["technique"] = technique
+
+    summaries = {}
+    for fit in an_model_fits.find(query, {"growth": 0, "nongrowth": 0, "fit.scenarios": 0}):
+        base = (fit["element"], fit["material"], fit.get("technique", ""), fit["precursor"],
+                fit["coreactant"], str(fit.get("temperature")))
+        summary = {key: fit["fit"].get(key) for key in
+                   ("best_scenario", "best_rmse", "nhat", "ndot0", "td")}
+        summary["publication"] = fit.get("publication")
+        summary["updated_at"] = fit["updated_at"].isoformat() if fit.get("updated_at") else None
+        for role, own, partner in (("growth", "growth_surface", "nongrowth_surface"),
+                                   ("non-growth", "nongrowth_surface", "growth_surface")):
+            key = base + (fit[own]["surface"], fit[own]["pretreatment"])
+            summaries.setdefault(key, []).append(dict(
+                summary, role=role,
+                partner_surface=fit[partner]["surface"],
+                partner_pretreatment=fit[partner]["pretreatment"]
+            ))
+    return summaries
+
 # BACKEND FIX - Updated an_model endpoint and recompute function
 
 @app.route("/api/an-model", methods=["POST"])
@@ -1646,66 +1729,69 @@ def an_model():
                 }), 500
         
         # Regular computation path (existing code)
-        lab_payload = {
-            "growth": growth,
-            "nongrowth": nongrowth
-        }
-        
-        # Call lab device computation service
-        lab_url = "https://2ee6d0e0fd14.ngrok-free.app/compute/an-model"
-        
-        print(f"Sending computation request to lab device: {lab_url}")
-        
-        # Make request to lab device with timeout
-        response = requests.post(
-            lab_url,
-            json=lab_payload,
-            headers={
-                "Content-Type": "application/json",
-                "ngrok-skip-browser-warning": "true"
-            },
-            timeout=300
-        )
-        
-        # Check if request was successful
-        if response.status_code == 200:
-            result = response.json()
-            print(f"Lab computation successful. Best scenario: {result.get('best_scenario', 'Unknown')}")
-            return jsonify(result)
-        else:
-            error_msg = f"Lab device returned error: {response.status_code}"
-            try:
-                error_detail = response.json()
-                error_msg += f" - {error_detail.get('error', 'Unknown error')}"
-            except:
-                error_msg += f" - {response.text}"
-            
-            print(f"Lab device error: {error_msg}")
-            return jsonify({
-                "error": error_msg,
-                "fallback_message": "Computation failed on lab device"
-            }), 500
-            
-    except requests.exceptions.Timeout:
-        return jsonify({
-            "error": "Lab device computation timed out",
-            "message": "The computation is taking longer than expected"
-        }), 504
-        
-    except requests.exceptions.ConnectionError:
+        cache_key = an_cache.key(growth, nongrowth, an_model_options(data))
+        cached = an_cache.get(cache_key)
+        if cached is not None:
+            print(f"AN model cache hit: {cache_key[:12]}")
+            return jsonify(dict(cached, cached=True))
+
+        options = an_model_options(data)
+        # Ask for the best fit found within the budget rather than timing out
+        options.setdefault("time_budget", Config.LAMBDA_TIMEOUT_THRESHOLD)
+
+        result = compute_router.run(growth, nongrowth, options)
+        print(f"Computation successful on {sorted(set(result.get('backends', {}).values()))}. "
+              f"Best scenario: {result.get('best_scenario', 'Unknown')}")
+        if not result.get("error") and not result.get("truncated"):
+            an_cache.put(cache_key, result)
+        return jsonify(result)
+
+    except BackendUnavailable as e:
+        print(f"No compute backend could run the AN model: {str(e)}")
         return jsonify({
-            "error": "Could not connect to lab device",
-            "message": "Please check if the lab device is online and the ngrok tunnel is active"
+            "error": f"No compute backend available: {str(e)}",
+            "message": "The lab device, Lambda and local computation all failed"
         }), 503
         
     except Exception as e:
-        print(f"Error calling lab device: {str(e)}")
+        print(f"Error running AN model computation: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
         return jsonify({
             "error": f"Failed to process computation request: {str(e)}",
             "message": "An unexpected error occurred"
         }), 500
 
+@app.route("/compute/an-model", methods=["POST"])
+def compute_an_model():
+    """Compute worker: run_an_model in this process, no cache or routing.
+
+    The same contract the lab device and the Lambda function serve, so
+    pointing AN_LAB_URL at another instance of this app (or this one)
+    exercises the HTTP backend locally. With AN_COMPUTE_TOKEN set, callers
+    must send it as X-Compute-Token; runs get the same default time budget
+    as the other AN-model routes.
+    """
+    token = Config.AN_COMPUTE_TOKEN
+    if token and not hmac.compare_digest(request.headers.get("X-Compute-Token", ""), token):
+        return jsonify({"error": "Invalid compute token"}), 401
+    try:
+        data = request.get_json()
+        growth = data.get("growth", [])
+        nongrowth = data.get("nongrowth", [])
+        if not growth or not nongrowth:
+            return jsonify({"error": "Both growth and nongrowth data required"}), 400
+
+        options = payload_to_options(data)
+        options.setdefault("time_budget", Config.LAMBDA_TIMEOUT_THRESHOLD)
+        result = run_an_model(growth, nongrowth, **options)
+        if result.get("error"):
+            return jsonify(result), 500
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"Error in compute worker: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 def recompute_with_custom_params(growth, nongrowth, scenario_name, params):
     """
     Recompute model with custom parameters - FIXED VERSION
@@ -1715,20 +1801,10 @@ def recompute_with_custom_params(growth, nongrowth, scenario_name, params):
         print(f"Scenario: {scenario_name}")
         print(f"Received params: {params} (type: {type(params)})")
         
-        # Use the local AN model function with custom parameters
-        data1 = np.array(growth, dtype=np.float64)
-        data2 = np.array(nongrowth, dtype=np.float64)
+        # Same arrays, gdot and horizon as the fit
+        data1, data2, gdot, ncycles = prepare_model_inputs(growth, nongrowth)
         
         print(f"Data1 shape: {data1.shape}, Data2 shape: {data2.shape}")
-        
-        if len(data1) < 2:
-            raise ValueError("Growth data must have at least 2 points")
-        
-        # Calculate gdot and ncycles (same as in vectorized_combination.py)
-        growth_rate = np.sum((data1[1:,1] - data1[:-1,1]) / (data1[1:,0] - data1[:-1,0]))
-        gdot = growth_rate / (len(data1) - 1)
-        ncycles = int(data2[-1,0] * 1.5)
-        
         print(f"Calculated: gdot={gdot:.6f}, ncycles={ncycles}")
         
         # Frontend always sends [nhat, ndot0, td] in that order
@@ -1744,17 +1820,12 @@ def recompute_with_custom_params(growth, nongrowth, scenario_name, params):
         print(f"  ndot0 = {ndot0}")
         print(f"  td = {td}")
         
-        # FIXED: Import and call the correct function
-        try:
-            from vectorized_combination import AN_Model_py_vc_exact
-            print(f"Successfully imported AN_Model_py_vc_exact")
-        except ImportError as e:
-            print(f"Failed to import AN_Model_py_vc_exact: {e}")
-            raise ValueError(f"Cannot import computation function: {e}")
-        
-        # Run the model with custom parameters
-        print(f"Calling AN_Model_py_vc_exact with parameters...")
-        rmse, V = AN_Model_py_vc_exact(gdot, nhat, ndot0, td, ncycles, data2, return_V=True)
+        # Rows already computed for these parameters (by the fit, or before
+        # later cycles were added) are reused; only new rows are computed
+        state = model_state(gdot, nhat, ndot0, td)
+        rows_before = state.rows_computed
+        rmse, V = state.evaluate(ncycles, data2, return_V=True)
+        print(f"Model rows computed: {state.rows_computed - rows_before} of {ncycles + 1}")
         
         if V is None:
             raise ValueError("Model computation returned no results (V is None)")
@@ -1809,6 +1880,392 @@ def recompute_with_custom_params(growth, nongrowth, scenario_name, params):
         print(error_msg)
         print(f"Traceback: {traceback.format_exc()}")
         raise Exception(error_msg)
+
+def an_model_options(data):
+    """Map optional request fields to run_an_model keyword arguments"""
+    return payload_to_options(data)
+
+def sse_event(event, payload):
+    data = json.dumps(payload, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+    return f"event: {event}\ndata: {data}\n\n"
+
+@app.route("/api/an-model/stream", methods=["POST"])
+def stream_an_model():
+    """Run the fit in-process and stream each finished scenario as Server-Sent Events.
+
+    Events: "scenario" (one per finished scenario, with its RMSE, the
+    current best and the evaluations used so far), then "result" with the
+    full run_an_model output, or "error". The run stops after timeBudget
+    seconds (default LAMBDA_TIMEOUT_THRESHOLD) with "truncated": true.
+    """
+    data = request.get_json()
+    growth = data.get("growth", [])
+    nongrowth = data.get("nongrowth", [])
+    if not growth or not nongrowth:
+        return jsonify({"error": "Both growth and nongrowth data required"}), 400
+    options = an_model_options(data)
+    options.setdefault("time_budget", Config.LAMBDA_TIMEOUT_THRESHOLD)
+
+    events = queue.Queue()
+
+    def run():
+        try:
+            result = an_cache.cached_run(run_an_model)(
+                growth, nongrowth,
+                progress_callback=lambda event: events.put(("scenario", event)),
+                **options
+            )
+            events.put(("error", result) if result.get("error") else ("result", result))
+        except Exception as e:
+            print(f"Error in streamed AN model run: {str(e)}")
+            events.put(("error", {"error": str(e)}))
+
+    threading.Thread(target=run, daemon=True).start()
+
+    def generate():
+        while True:
+            try:
+                event, payload = events.get(timeout=15)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, payload)
+            if event in ("result", "error"):
+                return
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/an-model/jobs", methods=["POST"])
+def submit_an_model_job():
+    try:
+        data = request.get_json()
+        growth = data.get("growth", [])
+        nongrowth = data.get("nongrowth", [])
+
+        if not growth or not nongrowth:
+            return jsonify({"error": "Both growth and nongrowth data required"}), 400
+
+        job_id = an_jobs.submit(growth, nongrowth, an_model_options(data))
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+    except Exception as e:
+        print(f"Error submitting AN model job: {str(e)}")
+        return jsonify({"error": f"Failed to submit job: {str(e)}"}), 500
+
+@app.route("/api/an-model/jobs/<job_id>", methods=["GET"])
+def get_an_model_job(job_id):
+    try:
+        job = an_jobs.get(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+
+        for key in ("created_at", "updated_at", "started_at", "finished_at", "expires_at"):
+            if job.get(key):
+                job[key] = job[key].isoformat()
+        return jsonify(job), 200
+
+    except Exception as e:
+        print(f"Error fetching AN model job {job_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/an-model/batch", methods=["POST"])
+def an_model_batch():
+    """Evaluate many [nhat, ndot0, td] rows on one dataset in a single pass"""
+    try:
+        data = request.get_json()
+        growth = data.get("growth", [])
+        nongrowth = data.get("nongrowth", [])
+        params = data.get("params", [])
+        return_curves = bool(data.get("returnCurves", False))
+
+        if not growth or not nongrowth:
+            return jsonify({"error": "Both growth and nongrowth data required"}), 400
+        if not params:
+            return jsonify({"error": "params must be a non-empty list of [nhat, ndot0, td] rows"}), 400
+        if len(params) > Config.AN_MODEL_BATCH_LIMIT:
+            return jsonify({
+                "error": f"At most {Config.AN_MODEL_BATCH_LIMIT} parameter rows per request"
+            }), 400
+
+        data1, data2, gdot, ncycles = prepare_model_inputs(growth, nongrowth)
+
+        start_time = datetime.now()
+        if return_curves:
+            rmse, curves = AN_Model_batch(gdot, params, ncycles, data2, return_curves=True)
+        else:
+            rmse = AN_Model_batch(gdot, params, ncycles, data2)
+        elapsed = (datetime.now() - start_time).total_seconds()
+
+        result = {
+            "rmse": rmse.tolist(),
+            "gdot": float(gdot),
+            "ncycles": ncycles,
+            "computation_time": elapsed
+        }
+        if return_curves:
+            result["model_x"] = list(range(ncycles + 1))
+            result["model_growth_y"] = (gdot * np.arange(ncycles + 1)).tolist()
+            result["model_nongrowth_y"] = curves.tolist()
+        return jsonify(result)
+
+    except ValueError as ve:
+        return jsonify({"error": f"Parameter validation failed: {str(ve)}"}), 400
+
+    except Exception as e:
+        print(f"Error in batch AN model evaluation: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return jsonify({"error": f"Batch computation failed: {str(e)}"}), 500
+    
+@app.route("/api/an-model/multi", methods=["POST"])
+def an_model_multi():
+    """Fit one growth series against several non-growth series in one request.
+
+    Body: growth, nongrowth (a list of non-growth series), optional labels
+    and the usual run options. Surfaces already in the result cache are not
+    refitted; the others share the growth rate and are fitted in parallel.
+    timeBudget (default LAMBDA_TIMEOUT_THRESHOLD) bounds the whole request.
+    """
+    try:
+        data = request.get_json()
+        growth = data.get("growth", [])
+        nongrowths = data.get("nongrowth", [])
+        labels = data.get("labels") or [f"surface {i + 1}" for i in range(len(nongrowths))]
+
+        if not growth or not nongrowths or not all(nongrowths):
+            return jsonify({"error": "growth and a non-empty list of nongrowth series required"}), 400
+        if len(nongrowths) > Config.AN_MULTI_SURFACE_LIMIT:
+            return jsonify({
+                "error": f"At most {Config.AN_MULTI_SURFACE_LIMIT} non-growth series per request"
+            }), 400
+        if len(labels) != len(nongrowths):
+            return jsonify({"error": "labels must match the nongrowth series one to one"}), 400
+
+        options = an_model_options(data)
+        keys = [an_cache.key(growth, series, options) for series in nongrowths]
+        cached = [an_cache.get(key) for key in keys]
+        misses = [i for i, hit in enumerate(cached) if hit is None]
+
+        options.setdefault("time_budget", Config.LAMBDA_TIMEOUT_THRESHOLD)
+        result = run_an_model_multi(growth, [nongrowths[i] for i in misses],
+                                    labels=[labels[i] for i in misses], **options)
+
+        fitted = iter(result["surfaces"])
+        surfaces = []
+        for i, hit in enumerate(cached):
+            if hit is not None:
+                surface = {k: v for k, v in hit.items() if k != "growth"}
+                surface.update(label=labels[i], cached=True, timing=None)
+            else:
+                surface = next(fitted)
+                if not surface.get("error") and not surface.get("truncated"):
+                    an_cache.put(keys[i], dict(
+                        {k: v for k, v in surface.items() if k not in ("label", "timing")},
+                        growth=result["growth"]
+                    ))
+            surfaces.append(surface)
+
+        print(f"Multi-surface fit: {len(misses)} of {len(nongrowths)} surfaces fitted "
+              f"on {result['workers']} workers in {result['computation_time']:.1f}s")
+        return jsonify(dict(result, surfaces=surfaces, cache_hits=len(nongrowths) - len(misses)))
+
+    except ValueError as ve:
+        return jsonify({"error": f"Validation failed: {str(ve)}"}), 400
+
+    except Exception as e:
+        print(f"Error in multi-surface AN model fit: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return jsonify({"error": f"Multi-surface computation failed: {str(e)}"}), 500
+
+@app.route("/api/an-model/bootstrap", methods=["POST"])
+def an_model_bootstrap():
+    """Bootstrap confidence intervals for nhat, ndot0 and td.
+
+    Body: growth, nongrowth, optional scenario and params (the point
+    estimate; otherwise the best scenario is fitted first), resamples,
+    confidence (default 0.95), seed and timeBudget (default
+    LAMBDA_TIMEOUT_THRESHOLD). Intervals come from the resamples refitted
+    within the budget; resamples_completed says how many that was.
+    """
+    try:
+        data = request.get_json()
+        growth = data.get("growth", [])
+        nongrowth = data.get("nongrowth", [])
+        if not growth or not nongrowth:
+            return jsonify({"error": "Both growth and nongrowth data required"}), 400
+
+        resamples = int(data.get("resamples") or 200)
+        if resamples > Config.AN_BOOTSTRAP_MAX_RESAMPLES:
+            return jsonify({
+                "error": f"At most {Config.AN_BOOTSTRAP_MAX_RESAMPLES} resamples per request"
+            }), 400
+
+        result = bootstrap_an_model(
+            growth, nongrowth,
+            scenario=data.get("scenario") or None,
+            params=data.get("params") or None,
+            resamples=resamples,
+            confidence=float(data.get("confidence") or 0.95),
+            seed=int(data.get("seed") or 0),
+            time_budget=float(data.get("timeBudget") or Config.LAMBDA_TIMEOUT_THRESHOLD)
+        )
+        print(f"Bootstrap for {result['scenario']}: {result['resamples_completed']} of "
+              f"{resamples} resamples in {result['computation_time']:.1f}s")
+        return jsonify(result)
+
+    except ValueError as ve:
+        return jsonify({"error": f"Validation failed: {str(ve)}"}), 400
+
+    except Exception as e:
+        print(f"Error in AN model bootstrap: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return jsonify({"error": f"Bootstrap computation failed: {str(e)}"}), 500
+
+@app.route("/api/an-model/sessions", methods=["POST"])
+def open_tuning_session():
+    """Open a parameter-tuning session; later updates send only [nhat, ndot0, td].
+
+    With "params" (and optionally "scenario") in the body the first
+    evaluation is returned along with the session id.
+    """
+    try:
+        data = request.get_json()
+        growth = data.get("growth", [])
+        nongrowth = data.get("nongrowth", [])
+        if not growth or not nongrowth:
+            return jsonify({"error": "Both growth and nongrowth data required"}), 400
+
+        tuning = tuning_sessions.open(growth, nongrowth)
+        if data.get("params"):
+            result = tuning.evaluate(data["params"], data.get("scenario", ""))
+        else:
+            result = tuning.status(tuning_sessions.latency_target)
+        return jsonify(dict(result, ttl=tuning_sessions.ttl)), 201
+
+    except ValueError as ve:
+        return jsonify({"error": f"Parameter validation failed: {str(ve)}"}), 400
+
+    except Exception as e:
+        print(f"Error opening tuning session: {str(e)}")
+        return jsonify({"error": f"Failed to open tuning session: {str(e)}"}), 500
+
+@app.route("/api/an-model/sessions/<session_id>/evaluate", methods=["POST"])
+def evaluate_tuning_session(session_id):
+    tuning = tuning_sessions.get(session_id)
+    if tuning is None:
+        return jsonify({"error": "Tuning session not found or expired"}), 404
+    try:
+        data = request.get_json()
+        return jsonify(tuning.evaluate(data.get("params", []), data.get("scenario", "")))
+
+    except ValueError as ve:
+        return jsonify({"error": f"Parameter validation failed: {str(ve)}"}), 400
+
+    except Exception as e:
+        print(f"Error evaluating tuning session {session_id}: {str(e)}")
+        return jsonify({"error": f"Custom parameter computation failed: {str(e)}"}), 500
+
+@app.route("/api/an-model/sessions/<session_id>", methods=["GET"])
+def get_tuning_session(session_id):
+    """Session state and p50/p95/max evaluation latency against the target"""
+    tuning = tuning_sessions.get(session_id)
+    if tuning is None:
+        return jsonify({"error": "Tuning session not found or expired"}), 404
+    return jsonify(tuning.status(tuning_sessions.latency_target)), 200
+
+@app.route("/api/an-model/sessions/<session_id>", methods=["DELETE"])
+def close_tuning_session(session_id):
+    if not tuning_sessions.close(session_id):
+        return jsonify({"error": "Tuning session not found or expired"}), 404
+    return jsonify({"session_id": session_id, "status": "closed"}), 200
+
+@app.route("/api/an-model/bulk", methods=["POST"])
+def start_an_model_bulk():
+    """Fit every stored growth/non-growth pair matching the request filters.
+
+    Runs in the background; pairs already fitted on their current readings
+    are skipped, so posting the same filters again resumes an interrupted run.
+    """
+    user = session.get('user')
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+    is_authorized = authorized_users.find_one({"emails": {"$in": [user.get("email")]}})
+    if not is_authorized:
+        return jsonify({"error": "Not authorized"}), 403
+
+    try:
+        data = request.get_json() or {}
+        filters = {field: data.get(field) for field in PAIR_FILTER_FIELDS if data.get(field) not in (None, "")}
+        workers = max(1, min(int(data.get("workers") or Config.AN_BULK_WORKERS), Config.AN_BULK_WORKERS))
+        force = bool(data.get("force", False))
+
+        run_id = uuid.uuid4().hex
+        now = datetime.now()
+        an_model_bulk_runs.insert_one({
+            "_id": run_id,
+            "status": "running",
+            "filters": filters,
+            "workers": workers,
+            "force": force,
+            "progress": None,
+            "error": None,
+            "submittedBy": user.get("email"),
+            "created_at": now,
+            "updated_at": now
+        })
+
+        def progress(event):
+            an_model_bulk_runs.update_one(
+                {"_id": run_id},
+                {"$set": {"progress": event, "updated_at": datetime.now()}}
+            )
+
+        def run():
+            try:
+                options = an_model_options(data)
+                options.setdefault("time_budget", Config.AN_FIT_TIME_BUDGET_SECONDS)
+                # Claimed like the maintainer's fits, so the two never fit a pair at once
+                fitter = ANModelBulkFitter(collection, an_model_fits, max_workers=workers,
+                                           options=options, progress_callback=progress,
+                                           claim_for=FIT_CLAIM_SECONDS)
+                final = fitter.run(filters, force=force)
+                an_model_bulk_runs.update_one({"_id": run_id}, {"$set": {
+                    "status": "done", "progress": final, "finished_at": datetime.now(),
+                    "updated_at": datetime.now()
+                }})
+            except Exception as e:
+                print(f"Bulk AN model run {run_id} failed: {e}")
+                print(traceback.format_exc())
+                an_model_bulk_runs.update_one({"_id": run_id}, {"$set": {
+                    "status": "failed", "error": str(e), "finished_at": datetime.now(),
+                    "updated_at": datetime.now()
+                }})
+
+        threading.Thread(target=run, daemon=True).start()
+        return jsonify({"run_id": run_id, "status": "running"}), 202
+
+    except Exception as e:
+        print(f"Error starting bulk AN model run: {str(e)}")
+        return jsonify({"error": f"Failed to start bulk run: {str(e)}"}), 500
+
+@app.route("/api/an-model/bulk/<run_id>", methods=["GET"])
+def get_an_model_bulk(run_id):
+    try:
+        run = an_model_bulk_runs.find_one({"_id": run_id})
+        if not run:
+            return jsonify({"error": "Bulk run not found"}), 404
+
+        run["run_id"] = run.pop("_id")
+        for key in ("created_at", "updated_at", "finished_at"):
+            if run.get(key):
+                run[key] = run[key].isoformat()
+        return jsonify(run), 200
+
+    except Exception as e:
+        print(f"Error fetching bulk AN model run {run_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
     
 if __name__ == "__main__":
     app.run(port=5001, debug=True)
\ No newline at end of file
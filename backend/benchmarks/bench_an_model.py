@@ -0,0 +1,333 @@
+"""
+Benchmark and accuracy suite for the AN model engine in vectorized_combination.py.
+
+    python benchmarks/bench_an_model.py                 (from backend/)
+    python benchmarks/bench_an_model.py --quick         smaller sizes
+    python benchmarks/bench_an_model.py --json out.json save the measurements
+    python benchmarks/bench_an_model.py --update-golden [--reference REV]
+                                                        regenerate golden outputs
+
+Every benchmark records wall time, model evaluations and peak traced
+memory (tracemalloc: NumPy and Python allocations). The model speedup is
+against the baseline commit's AN_Model_py_vc_exact (GOLDEN_REFERENCE, up
+to BASELINE_MODEL_LIMIT cycles); "vs NumPy" is against
+AN_Model_py_vc_numpy, the column-by-column version kept in the tree,
+which already includes the earlier vectorisation. The accuracy checks
+compare the model against benchmarks/golden/an_model_golden.json and the
+fast dV kernel against the reference one; the script exits non-zero if
+any check fails.
+
+Golden outputs come from a reference commit, never from the code under
+test: --update-golden checks REV (default GOLDEN_REFERENCE, the commit
+before the performance work) out into a temporary git worktree and
+records its hash. Model columns come from its AN_Model_py_vc_exact; for
+datasets up to FIT_GOLDEN_MAX_CYCLES (its cubic kernel makes longer fits
+take hours) its run_an_model gives the best and per-scenario RMSE and
+model evaluations, which the fits here must not exceed.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from vectorized_combination import (AN_Model_py_vc_exact, AN_Model_py_vc_numpy,
+                                    compute_dV_matrix_exact, check_dV_kernels,
+                                    run_an_model, warmup_kernels, DV_KERNEL_RTOL)
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'an_model_golden.json')
+
+NCYCLES_SIZES = (250, 1000, 4000)
+QUICK_NCYCLES_SIZES = (250, 1000)
+REFERENCE_DV_LIMIT = 600  # the O(rmax^3) reference kernel is only timed up to here
+BASELINE_MODEL_LIMIT = 1000  # likewise the baseline model, ~16 s per call at 4000 cycles
+PARAM_SETS = {  # nhat, ndot0, td
+    'nhat only': (1.0e-04, 0.0, 0),
+    'nhat + ndot0 + td': (3.8e-05, 3.4e-07, 10),
+}
+GDOT = 0.063
+
+# Golden model cases: (gdot, nhat, ndot0, td, ncycles)
+GOLDEN_CASES = [
+    (0.12, 0.01, 0.0, 0, 180),
+    (0.12, 0.0, 0.02, 0, 180),
+    (0.12, 0.01, 0.001, 30, 180),
+    (0.063, 3.8e-05, 3.4e-07, 10, 600),
+    (0.5, 1e-3, 1e-2, 100, 400),
+]
+GOLDEN_COLUMNS = (3, 4, 5, 6, 9, 10, 11)
+MODEL_RTOL = 1e-9
+FIT_RMSE_RTOL = 1e-6  # a fit may improve on its golden RMSE, never regress
+GOLDEN_REFERENCE = 'f2bd1a2'  # baseline commit the golden outputs are generated from
+FIT_GOLDEN_MAX_CYCLES = 1500
+
+
+def synthetic_nongrowth(ncycles, points=12):
+    """Non-growth readings spanning the horizon that yields `ncycles`"""
+    cycles = np.linspace(0, ncycles / 1.5, points)
+    return np.column_stack([cycles, 0.01 * cycles])
+
+
+def synthetic_dataset(ncycles, params=(3.8e-05, 3.4e-07, 10), gdot=GDOT, points=12, seed=0):
+    """Growth line plus noisy model-generated non-growth readings"""
+    rng = np.random.default_rng(seed)
+    last_cycle = ncycles / 1.5
+    growth_cycles = np.linspace(0, last_cycle, 6)
+    growth = np.column_stack([growth_cycles, gdot * growth_cycles])
+
+    _, V = AN_Model_py_vc_exact(gdot, *params, ncycles, np.array([[last_cycle, 0.0]]), return_V=True)
+    cycles = np.round(np.linspace(0, last_cycle, points))
+    thickness = V[cycles.astype(int), 3] + rng.normal(0, 0.05, points)
+    nongrowth = np.column_stack([cycles, np.maximum(thickness, 0)])
+    return growth.tolist(), nongrowth.tolist()
+
+
+def load_bundled_dataset():
+    import pandas as pd
+    growth = pd.read_excel(os.path.join(BACKEND_DIR, 'Data1.xlsx'), header=None).values.tolist()
+    nongrowth = pd.read_excel(os.path.join(BACKEND_DIR, 'Data2.xlsx'), header=None).values.tolist()
+    return growth, nongrowth
+
+
+def measure(fn, repeat=1):
+    """Best wall time over `repeat` runs, peak traced memory, last return value"""
+    best = float('inf')
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            value = fn()
+            best = min(best, time.perf_counter() - start)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak, value
+
+
+def bench_model(sizes, baseline, repeat=3):
+    """Fused-kernel AN_Model_py_vc_exact against the baseline module's and the NumPy version"""
+    baseline.AN_Model_py_vc_exact(GDOT, 1e-4, 1e-6, 2, 10, synthetic_nongrowth(10))  # compile
+    rows = []
+    for label, params in PARAM_SETS.items():
+        for ncycles in sizes:
+            data2 = synthetic_nongrowth(ncycles)
+            fused, fused_peak, _ = measure(
+                lambda: AN_Model_py_vc_exact(GDOT, *params, ncycles, data2, return_V=True), repeat)
+            numpy_ref, numpy_peak, _ = measure(
+                lambda: AN_Model_py_vc_numpy(GDOT, *params, ncycles, data2, return_V=True), repeat)
+            row = {'benchmark': 'AN_Model_py_vc_exact', 'case': label, 'ncycles': ncycles,
+                   'wall_s': fused, 'peak_bytes': fused_peak, 'evaluations': 1,
+                   'numpy_wall_s': numpy_ref, 'numpy_peak_bytes': numpy_peak,
+                   'numpy_speedup': numpy_ref / fused}
+            if ncycles <= BASELINE_MODEL_LIMIT:
+                base_wall, base_peak, _ = measure(
+                    lambda: baseline.AN_Model_py_vc_exact(GDOT, *params, ncycles, data2, return_V=True),
+                    repeat)
+                row.update({'baseline_wall_s': base_wall, 'baseline_peak_bytes': base_peak,
+                            'speedup': base_wall / fused})
+            rows.append(row)
+    return rows
+
+
+def bench_dV(sizes, repeat=3):
+    """compute_dV_matrix_exact in 'prefix' and (small sizes) 'reference' mode"""
+    rows = []
+    nhat, ndot0, td = PARAM_SETS['nhat + ndot0 + td']
+    compute_dV_matrix_exact(nhat, ndot0, td, GDOT, 3, 1, mode='reference')  # compile outside the timing
+    for ncycles in sizes:
+        rmax = ncycles + 1
+        wall, peak, _ = measure(lambda: compute_dV_matrix_exact(nhat, ndot0, td, GDOT, rmax, 1), repeat)
+        row = {'benchmark': 'compute_dV_matrix_exact', 'case': 'prefix', 'ncycles': ncycles,
+               'wall_s': wall, 'peak_bytes': peak, 'evaluations': 1}
+        if ncycles <= REFERENCE_DV_LIMIT:
+            ref_wall, _, _ = measure(
+                lambda: compute_dV_matrix_exact(nhat, ndot0, td, GDOT, rmax, 1, mode='reference'), 1)
+            row['reference_wall_s'] = ref_wall
+            row['speedup'] = ref_wall / wall
+        rows.append(row)
+    return rows
+
+
+def bench_run(datasets):
+    """Full run_an_model fits; model output printing is suppressed"""
+    rows = []
+    for label, (growth, nongrowth) in datasets.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall, peak, result = measure(lambda: run_an_model(growth, nongrowth))
+        rows.append({'benchmark': 'run_an_model', 'case': label,
+                     'ncycles': int(nongrowth[-1][0] * 1.5), 'wall_s': wall, 'peak_bytes': peak,
+                     'evaluations': result.get('model_evaluations'),
+                     'best_scenario': result.get('best_scenario'),
+                     'best_rmse': result.get('best_rmse'),
+                     'scenarios': {name: {'rmse': s['rmse'], 'evaluations': s.get('evaluations')}
+                                   for name, s in result.get('all_scenarios', {}).items()}})
+    return rows
+
+
+def load_reference(rev):
+    """(commit hash, vectorized_combination) of git revision rev, checked out in a temporary worktree"""
+    git = ['git', '-C', BACKEND_DIR]
+    commit = subprocess.run(git + ['rev-parse', '--verify', f'{rev}^{{commit}}'], check=True,
+                            capture_output=True, text=True).stdout.strip()
+    # A fixed path per commit, so numba's cache for the reference is reused between runs
+    worktree = os.path.join(tempfile.gettempdir(), f'an-golden-{commit[:12]}')
+    if not os.path.isdir(worktree):
+        subprocess.run(git + ['worktree', 'add', '--detach', worktree, commit], check=True,
+                       capture_output=True)
+    name = 'golden_reference'
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(worktree, 'backend', 'vectorized_combination.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # numba's cached dispatchers look the module up by name
+    spec.loader.exec_module(module)
+    return commit, module
+
+def reference_fit(reference, growth, nongrowth):
+    """Reference run_an_model with its model evaluations counted per scenario"""
+    model, run_fit = reference.AN_Model_py_vc_exact, reference.run_fit_vc_exact
+    calls = [0]
+    scenarios = {}
+
+    def counted_model(*args, **kwargs):
+        calls[0] += 1
+        return model(*args, **kwargs)
+
+    def counted_fit(scenario):
+        before = calls[0]
+        name, result = run_fit(scenario)
+        scenarios[name] = {'rmse': float(result['rmse']), 'evaluations': calls[0] - before}
+        return name, result
+
+    reference.AN_Model_py_vc_exact, reference.run_fit_vc_exact = counted_model, counted_fit
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = reference.run_an_model(growth, nongrowth)
+    finally:
+        reference.AN_Model_py_vc_exact, reference.run_fit_vc_exact = model, run_fit
+    return {'best_scenario': result['best_scenario'], 'best_rmse': result['best_rmse'],
+            'evaluations': sum(s['evaluations'] for s in scenarios.values()),
+            'scenarios': scenarios}
+
+def golden_outputs(datasets, rev):
+    """Reference outputs from commit rev: model columns, and fits of the datasets short enough"""
+    commit, reference = load_reference(rev)
+    models = []
+    for gdot, nhat, ndot0, td, ncycles in GOLDEN_CASES:
+        data2 = synthetic_nongrowth(ncycles)
+        rmse, V = reference.AN_Model_py_vc_exact(gdot, nhat, ndot0, td, ncycles, data2, return_V=True)
+        models.append({'args': [gdot, nhat, ndot0, td, ncycles], 'rmse': rmse,
+                       'columns': {str(c): V[:, c].tolist() for c in GOLDEN_COLUMNS}})
+    fits = {}
+    for label, (growth, nongrowth) in datasets.items():
+        if nongrowth[-1][0] * 1.5 <= FIT_GOLDEN_MAX_CYCLES:
+            print(f"Fitting '{label}' with {commit[:12]}")
+            fits[label] = reference_fit(reference, growth, nongrowth)
+    return {'reference': commit, 'models': models, 'fits': fits}
+
+
+def check_accuracy(golden, run_rows):
+    """List of failed-check messages (empty when everything matches)"""
+    failures = []
+    for case in golden['models']:
+        gdot, nhat, ndot0, td, ncycles = case['args']
+        data2 = synthetic_nongrowth(ncycles)
+        rmse, V = AN_Model_py_vc_exact(gdot, nhat, ndot0, td, ncycles, data2, return_V=True)
+        for col, expected in case['columns'].items():
+            expected = np.array(expected, dtype=float)
+            if not np.allclose(V[:, int(col)], expected, rtol=MODEL_RTOL, atol=1e-12, equal_nan=True):
+                failures.append(f"model {case['args']} column {col} differs from golden")
+        if not np.isclose(rmse, case['rmse'], rtol=MODEL_RTOL):
+            failures.append(f"model {case['args']} RMSE {rmse} != golden {case['rmse']}")
+
+        deviation = check_dV_kernels(nhat, ndot0, td, gdot, min(ncycles + 1, REFERENCE_DV_LIMIT))
+        if deviation > DV_KERNEL_RTOL:
+            failures.append(f"dV kernel {case['args']} deviates from reference by {deviation:.2e}")
+
+    for row in run_rows:
+        expected = golden['fits'].get(row['case'])
+        if expected is None:
+            continue
+        if row['best_rmse'] > expected['best_rmse'] * (1 + FIT_RMSE_RTOL):
+            failures.append(f"fit '{row['case']}' RMSE {row['best_rmse']:.6g} "
+                            f"regressed from {expected['best_rmse']:.6g}")
+        if row['evaluations'] > expected['evaluations']:
+            failures.append(f"fit '{row['case']}' took {row['evaluations']} model evaluations, "
+                            f"golden {expected['evaluations']}")
+        for name, scenario in expected['scenarios'].items():
+            actual = row['scenarios'].get(name)
+            if actual is None:
+                failures.append(f"fit '{row['case']}' scenario '{name}' missing")
+                continue
+            if actual['rmse'] > scenario['rmse'] * (1 + FIT_RMSE_RTOL):
+                failures.append(f"fit '{row['case']}' scenario '{name}' RMSE {actual['rmse']:.6g} "
+                                f"regressed from {scenario['rmse']:.6g}")
+            if actual['evaluations'] > scenario['evaluations']:
+                failures.append(f"fit '{row['case']}' scenario '{name}' took {actual['evaluations']} "
+                                f"model evaluations, golden {scenario['evaluations']}")
+    return failures
+
+
+def print_rows(rows):
+    print(f"{'benchmark':<24} {'case':<20} {'ncycles':>8} {'wall (s)':>10} {'peak MB':>9} "
+          f"{'evals':>6} {'speedup':>8} {'vs NumPy':>9}")
+    for row in rows:
+        speedup = f"{row['speedup']:.1f}x" if 'speedup' in row else ''
+        numpy_speedup = f"{row['numpy_speedup']:.1f}x" if 'numpy_speedup' in row else ''
+        print(f"{row['benchmark']:<24} {row['case']:<20} {row['ncycles']:>8} {row['wall_s']:>10.4f} "
+              f"{row['peak_bytes'] / 1e6:>9.2f} {row['evaluations'] or 0:>6} {speedup:>8} "
+              f"{numpy_speedup:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--quick', action='store_true', help='smaller problem sizes')
+    parser.add_argument('--json', help='write the measurements to this file')
+    parser.add_argument('--update-golden', action='store_true', help='regenerate golden outputs')
+    parser.add_argument('--reference', default=GOLDEN_REFERENCE,
+                        help='git revision the golden outputs and model speedup are measured against')
+    args = parser.parse_args()
+
+    sizes = QUICK_NCYCLES_SIZES if args.quick and not args.update_golden else NCYCLES_SIZES
+    datasets = {'Data1/Data2.xlsx': load_bundled_dataset()}
+    for ncycles in sizes:
+        datasets[f'synthetic {ncycles}'] = synthetic_dataset(ncycles)
+
+    warmup_kernels()
+
+    if args.update_golden:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        golden = golden_outputs(datasets, args.reference)
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(golden, f)
+        print(f"Wrote {GOLDEN_PATH}")
+        return 0
+
+    run_rows = bench_run(datasets)
+    rows = bench_model(sizes, load_reference(args.reference)[1]) + bench_dV(sizes) + run_rows
+    print_rows(rows)
+
+    with open(GOLDEN_PATH) as f:
+        failures = check_accuracy(json.load(f), run_rows)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("Accuracy: " + ("FAILED" if failures else "all checks passed"))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': rows, 'failures': failures}, f, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
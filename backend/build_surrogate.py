@@ -0,0 +1,15 @@
+"""
+Build the AN model surrogate table used for fit start points.
+
+Run at build time (see render.yaml) or after changing the surrogate grid
+in vectorized_combination. The table is written to AN_SURROGATE_DIR
+(default backend/.an_surrogate) and is not committed.
+"""
+import time
+
+from vectorized_combination import build_surrogate_table, SURROGATE_DIR
+
+if __name__ == "__main__":
+    start = time.time()
+    shape = build_surrogate_table()
+    print(f"Surrogate table {shape} written to {SURROGATE_DIR} in {time.time() - start:.1f}s")
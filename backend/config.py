@@ -21,6 +21,35 @@ class Config:
     AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
     LAMBDA_FUNCTION_NAME = os.environ.get('LAMBDA_FUNCTION_NAME', 'an-model-computation')
     LAMBDA_TIMEOUT_THRESHOLD = 280
+    AN_MODEL_BATCH_LIMIT = int(os.environ.get('AN_MODEL_BATCH_LIMIT', '2000'))
+    AN_MULTI_SURFACE_LIMIT = int(os.environ.get('AN_MULTI_SURFACE_LIMIT', '20'))
+    AN_BOOTSTRAP_MAX_RESAMPLES = int(os.environ.get('AN_BOOTSTRAP_MAX_RESAMPLES', '2000'))
+    AN_JOB_WORKERS = int(os.environ.get('AN_JOB_WORKERS', '2'))
+    AN_JOB_STALE_SECONDS = int(os.environ.get('AN_JOB_STALE_SECONDS', '120'))
+    AN_JOB_HEARTBEAT_SECONDS = int(os.environ.get('AN_JOB_HEARTBEAT_SECONDS', '30'))
+    AN_JOB_TTL_SECONDS = int(os.environ.get('AN_JOB_TTL_SECONDS', str(7 * 24 * 3600)))
+    AN_CACHE_MAX_ENTRIES = int(os.environ.get('AN_CACHE_MAX_ENTRIES', '5000'))
+    AN_CACHE_MAX_AGE_SECONDS = int(os.environ.get('AN_CACHE_MAX_AGE_SECONDS', str(30 * 24 * 3600)))
+    AN_CACHE_OP_TIMEOUT_SECONDS = float(os.environ.get('AN_CACHE_OP_TIMEOUT_SECONDS', '2'))
+    AN_BULK_WORKERS = int(os.environ.get('AN_BULK_WORKERS', '2'))
+    # One maintainer process, started by the gunicorn master, refits edited readings
+    AN_FIT_MAINTAINER = os.environ.get('AN_FIT_MAINTAINER', '1') == '1'
+    AN_FIT_TIME_BUDGET_SECONDS = float(os.environ.get('AN_FIT_TIME_BUDGET_SECONDS', '60'))
+    # Compute backends tried in this order (lab, lambda, local); see an_compute.py
+    AN_COMPUTE_BACKENDS = [b.strip() for b in os.environ.get('AN_COMPUTE_BACKENDS', 'lab,lambda,local').split(',') if b.strip()]
+    # Fan scenarios out across backends only once every remote worker honours
+    # the scenarios/warmStarts/curves keys; remotes that don't are skipped for parts
+    AN_COMPUTE_FAN_OUT = os.environ.get('AN_COMPUTE_FAN_OUT', '0') == '1'
+    # Shared secret for /compute/an-model, sent by HTTPBackend as X-Compute-Token
+    AN_COMPUTE_TOKEN = os.environ.get('AN_COMPUTE_TOKEN')
+    AN_LAB_URL = os.environ.get('AN_LAB_URL')
+    AN_LAB_CONCURRENCY = int(os.environ.get('AN_LAB_CONCURRENCY', '2'))
+    AN_LAMBDA_CONCURRENCY = int(os.environ.get('AN_LAMBDA_CONCURRENCY', '4'))
+    AN_LOCAL_CONCURRENCY = int(os.environ.get('AN_LOCAL_CONCURRENCY', '1'))
+    # Interactive parameter-tuning sessions (an_tuning.py), kept in each worker's memory
+    AN_TUNING_SESSION_TTL_SECONDS = int(os.environ.get('AN_TUNING_SESSION_TTL_SECONDS', '900'))
+    AN_TUNING_MAX_SESSIONS = int(os.environ.get('AN_TUNING_MAX_SESSIONS', '200'))
+    AN_TUNING_LATENCY_TARGET_MS = int(os.environ.get('AN_TUNING_LATENCY_TARGET_MS', '100'))
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     
     ALLOWED_ORIGINS = [
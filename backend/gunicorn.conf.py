@@ -0,0 +1,30 @@
+# Picked up automatically by `gunicorn app:app` (see render.yaml)
+import os
+import subprocess
+import sys
+
+# Long fits stream progress over one request; match the lab request timeout
+timeout = 300
+
+def post_worker_init(worker):
+    """Load the AN model kernels before the worker accepts requests"""
+    from vectorized_combination import warmup_kernels
+
+    stats = warmup_kernels()
+    worker.log.info(
+        "AN model warm-up: cold %.2fs, warm %.3fs (cache %s)",
+        stats['cold_seconds'], stats['warm_seconds'], stats['cache_dir']
+    )
+
+def when_ready(server):
+    """Start the single AN fit maintainer process (an_bulk.py --maintain) next to the workers"""
+    server.an_fit_maintainer = subprocess.Popen(
+        [sys.executable, "an_bulk.py", "--maintain"],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    server.log.info("AN fit maintainer started (pid %s)", server.an_fit_maintainer.pid)
+
+def on_exit(server):
+    maintainer = getattr(server, "an_fit_maintainer", None)
+    if maintainer is not None and maintainer.poll() is None:
+        maintainer.terminate()
@@ -0,0 +1,13 @@
+"""
+Fill the Numba cache for vectorized_combination and report JIT latency.
+
+Run at build time (see render.yaml) so that gunicorn workers load compiled
+kernels from NUMBA_CACHE_DIR instead of compiling on their first request.
+"""
+from vectorized_combination import warmup_kernels
+
+if __name__ == "__main__":
+    stats = warmup_kernels()
+    print(f"Numba cache: {stats['cache_dir']}")
+    print(f"Cold model request: {stats['cold_seconds']:.2f}s")
+    print(f"Warm model request: {stats['warm_seconds']:.3f}s")
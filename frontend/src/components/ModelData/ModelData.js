@@ -387,6 +387,7 @@ const ModelData = ({ setUser, isAuthorized, user }) => {
   const [originalResults, setOriginalResults] = useState(null);
   const [hasBeenModified, setHasBeenModified] = useState(false);
   const [returnState, setReturnState] = useState(null);
+  const [tuningSessionId, setTuningSessionId] = useState(null);
 
   const navigate = useNavigate();
   const location = useLocation();
@@ -458,6 +459,7 @@ const ModelData = ({ setUser, isAuthorized, user }) => {
         model_nongrowth_y: result.model_nongrowth_y,
       });
       setHasBeenModified(false);
+      setTuningSessionId(null); // New dataset: the next parameter change opens a new session
     }
 
     // Build combined data for chart
@@ -547,25 +549,31 @@ const ModelData = ({ setUser, isAuthorized, user }) => {
     setIsLoading(true);
 
     try {
-      const payload = {
-        growth: originalGrowthData,
-        nongrowth: originalNonGrowthData,
-        customParams: {
-          scenario: bestScenario,
-          params: newParams,
-        },
-      };
-
-      console.log(
-        "Sending payload to backend:",
-        JSON.stringify(payload, null, 2)
-      );
-
-      const response = await fetch(`${config.BACKEND_API_URL}/api/an-model`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
-      });
+      // Only the parameters are sent while the tuning session is alive; the
+      // dataset goes up again when it is opened (first change, or expired)
+      const params = { scenario: bestScenario, params: newParams };
+      let response = null;
+      if (tuningSessionId) {
+        response = await fetch(
+          `${config.BACKEND_API_URL}/api/an-model/sessions/${tuningSessionId}/evaluate`,
+          {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(params),
+          }
+        );
+      }
+      if (!response || response.status === 404) {
+        response = await fetch(`${config.BACKEND_API_URL}/api/an-model/sessions`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            growth: originalGrowthData,
+            nongrowth: originalNonGrowthData,
+            ...params,
+          }),
+        });
+      }
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
@@ -581,6 +589,7 @@ const ModelData = ({ setUser, isAuthorized, user }) => {
         return;
       }
 
+      setTuningSessionId(result.session_id);
       processModelResults(result);
       setHasBeenModified(true); // NEW: Mark that parameters have been modified
     } catch (error) {